@@ -1,33 +1,58 @@
 #!/usr/bin/env python3
+import base64
 import configparser
+import ctypes
+import ctypes.util
+import fnmatch
 import glob
+import http.client
 import json
 import os
+import queue
 import re
+import selectors
 import signal
 import socket
+import struct
 import sys
-import tempfile
+import threading
 import time
-import urllib.error
 import urllib.request
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Pattern, Set, Tuple
-from urllib.parse import urlparse
+from typing import Callable, Dict, Iterator, List, Optional, Pattern, Set, Tuple
+from urllib.parse import ParseResult, unquote, urlparse
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
 APP_NAME = "syslog2dockerlog"
 DEFAULT_CONFIG_PATH = f"/etc/{APP_NAME}/{APP_NAME}.config"
+DEFAULT_OFFSETS_FILE = f"/var/lib/{APP_NAME}/offsets.json"
 HEALTH_FILE = os.environ.get("HEALTH_FILE", f"/run/{APP_NAME}/health.json")
+READ_CHUNK_SIZE = 1024 * 1024
+OUTPUT_BUFFER_SIZE = 64 * 1024
+OUTPUT_FLUSH_SECONDS = 0.1
+NOTIFY_QUEUE_SIZE = 1024
+NOTIFY_DROP_WARN_SECONDS = 60
 
 
 @dataclass
 class SourceConfig:
     name: str
     pattern: str
-    regex: Optional[Pattern[str]]
+    regex: Optional[Pattern]
     notifications_enabled: bool
     notification_levels: Set[str]
+    directory: str = ""
+    name_pattern: Optional[Pattern[str]] = None
+    directory_has_magic: bool = False
+    include_hidden: bool = False
+    required_literals: Tuple[bytes, ...] = ()
+    bulk_pattern: Optional[Pattern[bytes]] = None
+    process_lines: Optional[Callable[[List[bytes]], None]] = None
 
 
 @dataclass
@@ -60,18 +85,120 @@ class NotificationConfig:
         return raw_url
 
 
+class Inotify:
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    DIRECTORY_MASK = IN_MODIFY | IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    CREATED_MASK = IN_CREATE | IN_MOVED_TO
+    REMOVED_MASK = IN_MOVED_FROM | IN_DELETE
+    RESCAN_MASK = IN_Q_OVERFLOW | IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches: Dict[int, str] = {}
+
+    def add_watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory or "."), self.DIRECTORY_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self.watches[wd] = directory
+
+    def remove_watch(self, wd: int) -> None:
+        if self.watches.pop(wd, None) is not None:
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, str]]:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & self.RESCAN_MASK:
+                    # The watched directory itself went away or moved; drop the watch so a rescan re-adds it by path.
+                    if mask & self.IN_IGNORED:
+                        self.watches.pop(wd, None)
+                    elif mask & self.IN_MOVE_SELF:
+                        self.remove_watch(wd)
+                    events.append((mask, ""))
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name or mask & self.IN_ISDIR:
+                    continue
+                events.append((mask, os.path.join(directory, name)))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
 class LogForwarder:
-    LEVEL_PATTERN = re.compile(r"\b(CRITICAL|ERROR|WARN(?:ING)?|INFO)\b", re.IGNORECASE)
-    SYSLOG_PREFIX_PATTERN = re.compile(
-        r"^(?P<stamp>[A-Z][a-z]{2}\s+\d{1,2}\s+\d\d:\d\d:\d\d)\s+(?P<host>\S+)\s+(?P<msg>.+)$"
+    LINE_PATTERN = re.compile(
+        rb"^(?:(?P<stamp>[A-Z][a-z]{2} +\d{1,2} \d\d:\d\d:\d\d) (?P<host>\S+) (?=.))?"
+        rb"(?:.*?\b(?i:(?P<level>CRITICAL|ERROR|WARN(?:ING)?|INFO))\b)?"
     )
+    LEVEL_NAMES = {b"CRITICAL": "CRITICAL", b"ERROR": "ERROR", b"WARN": "WARN", b"WARNING": "WARN", b"INFO": "INFO"}
+    LEVEL_ALIASES = {"CRITICAL": "CRITICAL", "ERROR": "ERROR", "WARN": "WARN", "WARNING": "WARN", "INFO": "INFO"}
+    DURATION_PATTERN = re.compile(r"^(\d+)\s*(min|s|)$")
+    DURATION_UNITS = {"min": 60, "s": 1, "": 1}
+    NOTIFY_FIELDS = ("source", "level", "message", "event_timestamp", "hostname", "timestamp")
+    NOTIFY_JSON_KEYS = tuple(f'"{field}": ' for field in NOTIFY_FIELDS)
+    NOTIFY_YAML_KEYS = tuple(f"{field}: '" for field in NOTIFY_FIELDS)
 
     def __init__(self, config_path: str):
         self.config_path = config_path
-        self.shutdown_requested = False
+        self.shutdown_event = threading.Event()
+        self.shutdown_signal: Optional[int] = None
         self.offsets: Dict[Tuple[int, int], int] = {}
         self.key_to_path: Dict[Tuple[int, int], str] = {}
+        self.file_descriptors: Dict[Tuple[int, int], int] = {}
         self.touched_keys: Set[Tuple[int, int]] = set()
+        self.offsets_file = ""
+        self.saved_offsets: Dict[Tuple[int, int], int] = {}
+        self.offsets_save_failed = False
+        self.health_template: Tuple[bytes, bytes] = (b"", b"")
+        self.directory_mtimes: Dict[str, int] = {}
+        self.directory_entries: Dict[str, List[str]] = {}
+        self.inotify: Optional[Inotify] = None
+        self.watch_failures: Set[str] = set()
+        self.log_timestamp: Tuple[int, bytes] = (0, b"")
+        self.log_prefixes: Dict[Tuple[str, str], bytes] = {}
+        self.output = os.fdopen(sys.stdout.fileno(), "wb", buffering=OUTPUT_BUFFER_SIZE, closefd=False)
+        self.output_lock = threading.Lock()
+        self.output_flush_due: Optional[float] = None
+        self.notify_queue: "queue.Queue[Optional[Tuple[str, str, str, str, str]]]" = queue.Queue(NOTIFY_QUEUE_SIZE)
+        self.notify_thread: Optional[threading.Thread] = None
+        self.notify_dropped = 0
+        self.notify_drop_warned_at = 0.0
+        self.notify_base_headers: Dict[str, str] = {}
+        self.notify_payload_prefix = b""
+        self.notify_timestamp: Tuple[int, str] = (0, "")
+        self.notify_headers: Dict[Tuple[str, str], Dict[str, str]] = {}
 
         self.update_seconds = 5
         self.sources: List[SourceConfig] = []
@@ -94,6 +221,7 @@ class LogForwarder:
         updatefreq = parser.get("General", "updatefreq", fallback="5s")
         self.update_seconds = self.parse_duration(updatefreq)
         self.hostname_output = parser.getboolean("General", "hostname_output", fallback=True)
+        self.offsets_file = parser.get("General", "offsets_file", fallback=DEFAULT_OFFSETS_FILE).strip()
 
         message_format = parser.get("Notification", "format", fallback="yaml").strip().lower() or "yaml"
         if message_format not in {"yaml", "json"}:
@@ -109,6 +237,17 @@ class LogForwarder:
             message_format=message_format,
         )
 
+        auth_token = self.notifications.auth_token
+        if message_format == "json":
+            self.notify_base_headers = {"Content-Type": "application/json"}
+            self.notify_payload_prefix = b'{"app": ' + json.dumps(APP_NAME).encode("utf-8") + b", "
+        else:
+            self.notify_base_headers = {"Content-Type": "application/x-yaml"}
+            self.notify_payload_prefix = self.to_yaml({"app": APP_NAME}).encode("utf-8")
+        if auth_token:
+            self.notify_base_headers["Authorization"] = f"Bearer {auth_token}"
+        self.notify_headers = {}
+
         legacy_notifications_enabled = parser.getboolean("Notification", "enabled", fallback=False)
         legacy_notification_levels = self.parse_levels(
             parser.get("Notification", "levels", fallback="WARN,ERROR,CRITICAL")
@@ -124,7 +263,7 @@ class LogForwarder:
                 continue
             regex_raw = parser.get(section, "regex", fallback="").strip()
             try:
-                compiled = re.compile(regex_raw) if regex_raw else None
+                compiled = self.compile_source_regex(regex_raw) if regex_raw else None
             except re.error as exc:
                 raise ValueError(f"Invalid regex for section '{section}': {exc}") from exc
             notifications_enabled = parser.getboolean(
@@ -139,6 +278,7 @@ class LogForwarder:
                     fallback=",".join(sorted(legacy_notification_levels)),
                 )
             )
+            directory, basename = os.path.split(pattern)
             self.sources.append(
                 SourceConfig(
                     name=section,
@@ -146,51 +286,297 @@ class LogForwarder:
                     regex=compiled,
                     notifications_enabled=notifications_enabled,
                     notification_levels=notification_levels,
+                    directory=directory,
+                    name_pattern=re.compile(fnmatch.translate(basename)),
+                    directory_has_magic=glob.has_magic(directory),
+                    include_hidden=basename.startswith("."),
+                    required_literals=self.required_literals(compiled) if compiled else (),
+                    bulk_pattern=self.bulk_pattern(compiled) if compiled else None,
                 )
             )
 
         if not self.sources:
             raise ValueError("No log sources found in config. Add at least one section with input=... pattern.")
+        for source in self.sources:
+            source.process_lines = self.build_line_processor(source)
+
+        health_fields = json.dumps({"updatefreq": self.update_seconds, "sources": [source.name for source in self.sources]})
+        self.health_template = (b'{"status": "ok", "timestamp": ', b", " + health_fields[1:].encode("utf-8"))
+        self.load_offsets()
 
     @staticmethod
-    def parse_duration(raw: str) -> int:
-        value = raw.strip().lower()
-        if value.endswith("min"):
-            return max(1, int(value[:-3])) * 60
-        if value.endswith("s"):
-            return max(1, int(value[:-1]))
-        return max(1, int(value))
+    def regex_nodes(items) -> Iterator[Tuple[object, object]]:
+        for op, value in items:
+            yield op, value
+            if isinstance(value, sre_parse.SubPattern):  # ATOMIC_GROUP on Python 3.11+
+                yield from LogForwarder.regex_nodes(value)
+                continue
+            for child in value if isinstance(value, (tuple, list)) else ():
+                for nested in child if isinstance(child, list) else [child]:
+                    if isinstance(nested, sre_parse.SubPattern):
+                        yield from LogForwarder.regex_nodes(nested)
+
+    @classmethod
+    def compile_source_regex(cls, raw: str) -> Pattern:
+        text_regex = re.compile(raw)
+        parsed = sre_parse.parse(raw)
+        flags = parsed.state.flags
+        if not raw.isascii() or flags & sre_parse.SRE_FLAG_IGNORECASE:
+            return text_regex
+
+        # Lines are filtered before decoding only when the pattern cannot tell bytes from characters:
+        # '.', negated sets and Unicode-aware classes or word boundaries would count or classify UTF-8 bytes.
+        ascii_classes = bool(flags & sre_parse.SRE_FLAG_ASCII)
+        for op, value in cls.regex_nodes(parsed):
+            if op in (sre_parse.ANY, sre_parse.NOT_LITERAL):
+                return text_regex
+            # Escapes such as \xe9 are ASCII text but stand for non-ASCII characters.
+            if op is sre_parse.LITERAL and value >= 0x80:
+                return text_regex
+            if op is sre_parse.AT and value in (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY) and not ascii_classes:
+                return text_regex
+            if op is sre_parse.IN:
+                for item_op, item in value:
+                    if item_op is sre_parse.NEGATE or (item_op is sre_parse.CATEGORY and not ascii_classes):
+                        return text_regex
+                    if (item_op is sre_parse.LITERAL and item >= 0x80) or (item_op is sre_parse.RANGE and item[1] >= 0x80):
+                        return text_regex
+        try:
+            return re.compile(raw.encode("ascii"))
+        except re.error:
+            return text_regex
 
     @staticmethod
-    def parse_levels(raw: str) -> Set[str]:
+    def required_literals(regex: Pattern) -> Tuple[bytes, ...]:
+        def longest_run(items) -> bytes:
+            longest: List[int] = []
+            current: List[int] = []
+            for op, value in items:
+                if op is sre_parse.LITERAL:
+                    current.append(value)
+                    if len(current) > len(longest):
+                        longest = list(current)
+                else:
+                    current = []
+            if isinstance(regex.pattern, str):
+                return "".join(map(chr, longest)).encode("utf-8")
+            return bytes(longest)
+
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+        if parsed.state.flags & sre_parse.SRE_FLAG_IGNORECASE:
+            return ()
+
+        items = list(parsed)
+        while len(items) == 1 and items[0][0] is sre_parse.SUBPATTERN and not any(items[0][1][1:3]):
+            items = list(items[0][1][3])
+
+        literal = longest_run(items)
+        if literal:
+            return (literal,)
+        if len(items) == 1 and items[0][0] is sre_parse.BRANCH:
+            alternatives = tuple(longest_run(branch) for branch in items[0][1][1])
+            if all(alternatives):
+                return alternatives
+        return ()
+
+    @classmethod
+    def bulk_pattern(cls, regex: Pattern) -> Optional[Pattern[bytes]]:
+        if isinstance(regex.pattern, str):
+            return None
+        try:
+            for op, value in cls.regex_nodes(sre_parse.parse(regex.pattern, regex.flags)):
+                if op is sre_parse.AT and value in (sre_parse.AT_BEGINNING_STRING, sre_parse.AT_END_STRING):
+                    return None
+                # Lookarounds would see the neighbouring line through the newline.
+                if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                    return None
+            return re.compile(rb"^.*(?:" + regex.pattern + rb").*$", regex.flags | re.MULTILINE)
+        except re.error:
+            return None
+
+    @classmethod
+    def parse_duration(cls, raw: str) -> int:
+        match = cls.DURATION_PATTERN.match(raw.strip().lower())
+        if not match:
+            raise ValueError(f"Invalid duration '{raw}', expected e.g. 5, 5s or 1min")
+        return max(1, int(match.group(1))) * cls.DURATION_UNITS[match.group(2)]
+
+    @classmethod
+    def parse_levels(cls, raw: str) -> Set[str]:
         levels = set()
         for level in raw.split(","):
             cleaned = level.strip().upper()
             if not cleaned:
                 continue
-            levels.add("WARN" if cleaned == "WARNING" else cleaned)
+            try:
+                levels.add(cls.LEVEL_ALIASES[cleaned])
+            except KeyError:
+                raise ValueError(f"Unknown notification level '{level.strip()}'") from None
         return levels
 
-
     def run(self) -> None:
         self.register_signals()
         self.load()
         self.print_startup_summary()
+        self.start_notify_worker()
 
-        while not self.shutdown_requested:
-            self.touched_keys = set()
-            for source in self.sources:
-                self.process_source(source)
-            self.cleanup_stale_offsets()
-            self.write_health()
-            time.sleep(self.update_seconds)
+        selector = selectors.DefaultSelector()
+        wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+        selector.register(wakeup_read, selectors.EVENT_READ)
+
+        self.inotify = self.setup_inotify()
+        if self.inotify:
+            selector.register(self.inotify.fd, selectors.EVENT_READ)
+
+        next_tick = time.monotonic()
+        rescan_due = True
+        try:
+            while not self.shutdown_event.is_set():
+                now = time.monotonic()
+                if now >= next_tick:
+                    # With inotify, rescan only when events may have been missed: new watches, unwatchable
+                    # directories or a lost/overflowed event queue.
+                    if self.inotify is None or self.refresh_watches() or rescan_due:
+                        self.rescan_sources()
+                        rescan_due = False
+                    self.write_health()
+                    self.save_offsets()
+                    next_tick = now + self.update_seconds
+
+                flush_due = self.output_flush_due
+                if flush_due is not None and now >= flush_due:
+                    self.flush_output()
+                    flush_due = None
+
+                deadline = next_tick if flush_due is None else min(next_tick, flush_due)
+                for key, _events in selector.select(max(0.0, deadline - time.monotonic())):
+                    if key.fd == wakeup_read:
+                        self.drain_fd(wakeup_read)
+                    elif self.inotify and not self.process_inotify_events():
+                        rescan_due = True
+                        next_tick = time.monotonic()
+        finally:
+            signal.set_wakeup_fd(-1)
+            selector.close()
+            os.close(wakeup_read)
+            os.close(wakeup_write)
+            if self.inotify:
+                self.inotify.close()
+            for fd in self.file_descriptors.values():
+                os.close(fd)
+            self.file_descriptors.clear()
+            # Persist progress before waiting on the notification worker, which may block on a slow endpoint.
+            self.save_offsets()
+            if self.shutdown_signal is not None:
+                self.log("INFO", "general", f"Received signal {self.shutdown_signal}")
+            self.flush_output()
+            self.stop_notify_worker()
 
         self.log("INFO", "general", "Shutdown requested, exiting cleanly")
+        self.flush_output()
+
+    def setup_inotify(self) -> Optional[Inotify]:
+        try:
+            inotify = Inotify()
+        except (AttributeError, OSError) as exc:
+            self.log("WARN", "general", f"inotify unavailable, polling every {self.update_seconds}s: {exc}")
+            return None
+        self.inotify = inotify
+        self.refresh_watches()
+        return inotify
+
+    def refresh_watches(self) -> bool:
+        watched = set(self.inotify.watches.values())
+        failures: Set[str] = set()
+        added = False
+        for source in self.sources:
+            directories = [""]
+            if source.directory:
+                # Wildcard directory parts may also match plain files, which must not get a directory watch.
+                directories = [path for path in glob.glob(source.directory) if os.path.isdir(path)]
+            for directory in directories:
+                if directory in watched or directory in failures:
+                    continue
+                try:
+                    self.inotify.add_watch(directory)
+                except OSError as exc:
+                    failures.add(directory)
+                    if directory not in self.watch_failures:
+                        self.log(
+                            "WARN",
+                            source.name,
+                            f"Failed to watch {directory}, polling it every {self.update_seconds}s: {exc}",
+                        )
+                    continue
+                watched.add(directory)
+                added = True
+        self.watch_failures = failures
+        return added or bool(failures)
+
+    @staticmethod
+    def drain_fd(fd: int) -> None:
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def rescan_sources(self) -> None:
+        self.touched_keys.clear()
+        path_sources: Dict[str, List[SourceConfig]] = {}
+        for source in self.sources:
+            for path in self.discover_paths(source):
+                path_sources.setdefault(path, []).append(source)
+        for path, sources in path_sources.items():
+            self.read_path(path, sources)
+        self.cleanup_stale_offsets()
+
+    def process_inotify_events(self) -> bool:
+        changed: List[str] = []
+        created: Set[str] = set()
+        removed: Set[str] = set()
+        for mask, path in self.inotify.read_events():
+            if mask & Inotify.IN_Q_OVERFLOW:
+                self.log("WARN", "general", "inotify event queue overflowed, rescanning all sources")
+                return False
+            if mask & Inotify.RESCAN_MASK:
+                return False
+            if mask & Inotify.REMOVED_MASK:
+                removed.add(path)
+                continue
+            if mask & Inotify.CREATED_MASK:
+                created.add(path)
+            if path not in changed:
+                changed.append(path)
+
+        for path in changed:
+            sources = [source for source in self.sources if self.path_matches(source, path)]
+            if sources:
+                self.read_path(path, sources, from_start=path in created)
+
+        if removed:
+            self.forget_removed_paths(removed)
+        return True
+
+    def forget_removed_paths(self, removed: Set[str]) -> None:
+        for key, path in list(self.key_to_path.items()):
+            if path not in removed:
+                continue
+            try:
+                stat_result = os.stat(path)
+                if (stat_result.st_dev, stat_result.st_ino) == key:
+                    continue
+            except OSError:
+                pass
+            self.forget_key(key)
 
     def register_signals(self) -> None:
         def _handler(signum, _frame):
-            self.shutdown_requested = True
-            self.log("INFO", "general", f"Received signal {signum}")
+            self.shutdown_event.set()
+            self.shutdown_signal = signum
 
         signal.signal(signal.SIGTERM, _handler)
         signal.signal(signal.SIGINT, _handler)
@@ -227,77 +613,180 @@ class LogForwarder:
                 source.name,
                 f"notifications_enabled={source.notifications_enabled}, notification_levels={','.join(sorted(source.notification_levels)) or 'none'}",
             )
-            paths = sorted(glob.glob(source.pattern))
+            paths = self.discover_paths(source)
             if paths:
                 for path in paths:
                     self.log("INFO", source.name, f"Tracking file: {path}")
             else:
                 self.log("WARN", source.name, f"No files currently match pattern: {source.pattern}")
 
-    def process_source(self, source: SourceConfig) -> None:
-        for path in sorted(glob.glob(source.pattern)):
+    def discover_paths(self, source: SourceConfig) -> List[str]:
+        if source.directory_has_magic:
+            return sorted(glob.glob(source.pattern))
+
+        directory = source.directory
+        try:
+            mtime = os.stat(directory or ".").st_mtime_ns
+        except OSError:
+            return []
+        names = self.directory_entries.get(directory)
+        if names is None or self.directory_mtimes.get(directory) != mtime:
             try:
-                stat_result = os.stat(path)
-                key = (stat_result.st_dev, stat_result.st_ino)
-                self.touched_keys.add(key)
+                with os.scandir(directory or ".") as entries:
+                    names = sorted(entry.name for entry in entries)
+            except OSError:
+                return []
+            # A change within the filesystem's timestamp granularity may not move mtime; only trust settled listings.
+            if time.time_ns() - mtime > 1_000_000_000:
+                self.directory_entries[directory] = names
+                self.directory_mtimes[directory] = mtime
+            else:
+                self.directory_entries.pop(directory, None)
 
-                if key not in self.offsets:
-                    self.offsets[key] = stat_result.st_size
-                    self.key_to_path[key] = path
-                    continue
+        return [os.path.join(directory, name) for name in names if self.name_matches(source, name)]
 
-                offset = self.offsets[key]
-                if stat_result.st_size < offset:
-                    offset = 0
-
-                with open(path, "r", encoding="utf-8", errors="replace") as fh:
-                    fh.seek(offset)
-                    for line in fh:
-                        self.emit_line(source, line.rstrip("\n"))
-                    self.offsets[key] = fh.tell()
-                    self.key_to_path[key] = path
-            except FileNotFoundError:
-                continue
-            except PermissionError as exc:
-                self.log("ERROR", source.name, f"Permission denied for {path}: {exc}")
-            except OSError as exc:
-                self.log("ERROR", source.name, f"Failed reading {path}: {exc}")
+    @staticmethod
+    def name_matches(source: SourceConfig, name: str) -> bool:
+        if name.startswith(".") and not source.include_hidden:
+            return False
+        return source.name_pattern.match(name) is not None
 
-    def cleanup_stale_offsets(self) -> None:
-        stale = [key for key in self.offsets.keys() if key not in self.touched_keys]
-        for key in stale:
-            self.offsets.pop(key, None)
-            self.key_to_path.pop(key, None)
+    def path_matches(self, source: SourceConfig, path: str) -> bool:
+        directory, name = os.path.split(path)
+        if source.directory_has_magic:
+            # Same per-component rules as glob: wildcards never cross '/' and skip dot-directories.
+            parts = directory.split("/")
+            pattern_parts = source.directory.split("/")
+            if len(parts) != len(pattern_parts):
+                return False
+            for part, pattern in zip(parts, pattern_parts):
+                if part.startswith(".") and not pattern.startswith("."):
+                    return False
+                if not fnmatch.fnmatchcase(part, pattern):
+                    return False
+        elif directory != source.directory:
+            return False
+        return self.name_matches(source, name)
 
-    def normalize_line(self, line: str) -> Tuple[str, str, str]:
-        match = self.SYSLOG_PREFIX_PATTERN.match(line)
-        if not match:
-            hostname = self.server_hostname if self.hostname_output else "-"
-            return "-", hostname, line
+    def read_path(self, path: str, sources: List[SourceConfig], from_start: bool = False) -> None:
+        try:
+            stat_result = os.stat(path)
+            key = (stat_result.st_dev, stat_result.st_ino)
+            self.touched_keys.add(key)
+
+            if key not in self.offsets:
+                # Files seen being created (e.g. by rotation) are read in full; scanned files start at the end.
+                self.offsets[key] = 0 if from_start else stat_result.st_size
+                self.key_to_path[key] = path
+                if not from_start:
+                    return
 
-        hostname = match.group("host") if self.hostname_output else "-"
-        return match.group("stamp"), hostname, match.group("msg")
+            offset = self.offsets[key]
+            if stat_result.st_size < offset:
+                offset = 0
 
-    def emit_line(self, source: SourceConfig, line: str) -> None:
-        if source.regex and not source.regex.search(line):
+            fd = self.file_descriptors.get(key)
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+                opened = os.fstat(fd)
+                if (opened.st_dev, opened.st_ino) != key:
+                    # Replaced between stat() and open(); the next event or rescan picks up the new file.
+                    os.close(fd)
+                    return
+                self.file_descriptors[key] = fd
+
+            # Tracked files stay open and are read positionally: one pread() per chunk, no open/seek/close.
+            read_offset = offset
+            carry = b""
+            while True:
+                chunk = os.pread(fd, READ_CHUNK_SIZE, read_offset)
+                if not chunk:
+                    break
+                read_offset += len(chunk)
+                buffer = carry + chunk
+                end = buffer.rfind(b"\n")
+                if end < 0:
+                    carry = buffer
+                    continue
+                carry = buffer[end + 1 :]
+                offset += end + 1
+                block = buffer[:end]
+                for source in sources:
+                    source.process_lines(self.select_lines(source, block))
+            self.offsets[key] = offset
+            self.key_to_path[key] = path
+        except FileNotFoundError:
             return
+        except PermissionError as exc:
+            self.log("ERROR", sources[0].name, f"Permission denied for {path}: {exc}")
+        except OSError as exc:
+            self.log("ERROR", sources[0].name, f"Failed reading {path}: {exc}")
+
+    def cleanup_stale_offsets(self) -> None:
+        for key in self.offsets.keys() - self.touched_keys:
+            self.forget_key(key)
+
+    def forget_key(self, key: Tuple[int, int]) -> None:
+        self.offsets.pop(key, None)
+        self.key_to_path.pop(key, None)
+        fd = self.file_descriptors.pop(key, None)
+        if fd is not None:
+            os.close(fd)
+
+    def select_lines(self, source: SourceConfig, region: bytes) -> List[bytes]:
+        if source.regex is None:
+            return region.split(b"\n")
+        if source.required_literals and not any(literal in region for literal in source.required_literals):
+            return []
+
+        regex_search = source.regex.search
+        if isinstance(source.regex.pattern, str):
+            return [line for line in region.split(b"\n") if regex_search(line.decode("utf-8", "replace"))]
+        if source.bulk_pattern is None:
+            return [line for line in region.split(b"\n") if regex_search(line)]
+
+        lines = []
+        for match in source.bulk_pattern.finditer(region):
+            line = match.group()
+            if b"\n" in line:
+                # The source regex itself matched across a newline; fall back to per-line checks.
+                lines.extend(part for part in line.split(b"\n") if regex_search(part))
+            else:
+                lines.append(line)
+        return lines
 
-        event_timestamp, hostname, normalized_line = self.normalize_line(line)
-        level = self.detect_level(normalized_line)
-        self.log(level, source.name, normalized_line, event_timestamp=event_timestamp, hostname=hostname)
+    def build_line_processor(self, source: SourceConfig) -> Callable[[List[bytes]], None]:
+        notify_enabled = source.notifications_enabled and self.notifications.ntfy_url
 
-        if source.notifications_enabled and self.notifications.ntfy_url and level in source.notification_levels:
-            self.notify_ntfy(level, source.name, normalized_line, event_timestamp, hostname)
+        # Everything constant for this source is bound as a default argument, the cheapest lookup in CPython.
+        def process_lines(
+            lines: List[bytes],
+            line_match=self.LINE_PATTERN.match,
+            level_names=self.LEVEL_NAMES,
+            log=self.log,
+            notify=self.notify_ntfy,
+            notification_levels=frozenset(source.notification_levels if notify_enabled else ()),
+            hostname_output=self.hostname_output,
+            default_hostname=self.server_hostname if self.hostname_output else "-",
+            name=source.name,
+        ) -> None:
+            for line in lines:
+                match = line_match(line)
+                stamp, host, level = match.group("stamp", "host", "level")
+                level_name = level_names[level.upper()] if level else "INFO"
+                if stamp is None:
+                    normalized_line = line.decode("utf-8", "replace")
+                    event_timestamp, hostname = "-", default_hostname
+                else:
+                    normalized_line = line[match.end("host") + 1 :].decode("utf-8", "replace")
+                    event_timestamp = stamp.decode("utf-8", "replace")
+                    hostname = host.decode("utf-8", "replace") if hostname_output else "-"
 
-    def detect_level(self, line: str) -> str:
-        found = self.LEVEL_PATTERN.search(line)
-        if not found:
-            return "INFO"
+                log(level_name, name, normalized_line, event_timestamp, hostname)
+                if level_name in notification_levels:
+                    notify(level_name, name, normalized_line, event_timestamp, hostname)
 
-        level = found.group(1).upper()
-        if level == "WARNING":
-            return "WARN"
-        return level
+        return process_lines
 
     def log(
         self,
@@ -307,47 +796,156 @@ class LogForwarder:
         event_timestamp: str = "-",
         hostname: str = "-",
     ) -> None:
-        timestamp = datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
-        print(
-            f"{timestamp} [{level:<8}] [{source:<16}] [{event_timestamp:<15}] [{hostname:<20}] {message}",
-            flush=True,
-        )
+        now = int(time.time())
+        cached_second, timestamp = self.log_timestamp
+        if now != cached_second:
+            timestamp = datetime.fromtimestamp(now, timezone.utc).astimezone().isoformat(timespec="seconds").encode("ascii")
+            self.log_timestamp = (now, timestamp)
+        prefix = self.log_prefixes.get((level, source))
+        if prefix is None:
+            prefix = f" [{level:<8}] [{source:<16}] [".encode("utf-8", "surrogateescape")
+            self.log_prefixes[(level, source)] = prefix
+        suffix = f"{event_timestamp:<15}] [{hostname:<20}] {message}\n"
+        line = timestamp + prefix + suffix.encode("utf-8", "surrogateescape")
+        with self.output_lock:
+            self.output.write(line)
+            if self.output_flush_due is None:
+                self.output_flush_due = time.monotonic() + OUTPUT_FLUSH_SECONDS
+
+    def flush_output(self) -> None:
+        with self.output_lock:
+            self.output_flush_due = None
+            self.output.flush()
+
+    def start_notify_worker(self) -> None:
+        if not self.notifications.ntfy_url or not any(source.notifications_enabled for source in self.sources):
+            return
+        self.notify_thread = threading.Thread(target=self.notify_worker, name="ntfy", daemon=True)
+        self.notify_thread.start()
+
+    def stop_notify_worker(self) -> None:
+        if not self.notify_thread:
+            return
+        try:
+            self.notify_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.notify_thread.join(timeout=10)
 
     def notify_ntfy(self, level: str, source: str, message: str, event_timestamp: str, hostname: str) -> None:
-        notification_event = {
-            "app": APP_NAME,
-            "source": source,
-            "level": level,
-            "message": message,
-            "event_timestamp": event_timestamp,
-            "hostname": hostname,
-            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-        }
+        try:
+            self.notify_queue.put_nowait((level, source, message, event_timestamp, hostname))
+        except queue.Full:
+            self.notify_dropped += 1
+            now = time.monotonic()
+            if now - self.notify_drop_warned_at >= NOTIFY_DROP_WARN_SECONDS:
+                self.notify_drop_warned_at = now
+                self.log(
+                    "WARN",
+                    "notification",
+                    f"Notification queue full, dropped {self.notify_dropped} notification(s) so far",
+                )
 
+    def notify_worker(self) -> None:
+        url = urlparse(self.notifications.ntfy_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        host, port = url.hostname, url.port
+        tunnel_headers: Optional[Dict[str, str]] = None
+        connection: Optional[http.client.HTTPConnection] = None
+
+        # Honour HTTP(S)_PROXY/NO_PROXY like urllib.request.urlopen does.
+        proxy = self.ntfy_proxy(url)
+        if proxy:
+            proxy_headers = {}
+            if proxy.username:
+                credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}".encode("utf-8")
+                proxy_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials).decode("ascii")
+            if url.scheme == "https":
+                tunnel_headers = proxy_headers
+            else:
+                path = self.notifications.ntfy_url
+                self.notify_base_headers.update(proxy_headers)
+                self.notify_headers.clear()
+            host, port = proxy.hostname, proxy.port or (443 if proxy.scheme == "https" else 80)
+
+        while True:
+            try:
+                event = self.notify_queue.get(timeout=1)
+            except queue.Empty:
+                if not self.shutdown_event.is_set():
+                    continue
+                event = None
+            if event is None:
+                if connection:
+                    connection.close()
+                self.flush_output()
+                return
+
+            payload, headers = self.build_notification(*event)
+            for attempt in range(2):
+                if connection is None:
+                    connection = connection_class(host, port, timeout=10)
+                    if tunnel_headers is not None:
+                        connection.set_tunnel(url.hostname, url.port, headers=tunnel_headers)
+                try:
+                    connection.request("POST", path, body=payload, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as exc:
+                    connection.close()
+                    connection = None
+                    if attempt:
+                        self.log("ERROR", "notification", f"Failed to deliver ntfy notification: {exc}")
+                    continue
+                if response.status >= 400:
+                    self.log(
+                        "ERROR",
+                        "notification",
+                        f"Failed to deliver ntfy notification: HTTP {response.status} {response.reason}",
+                    )
+                break
+
+            if self.output_flush_due is not None:
+                self.flush_output()
+
+    @staticmethod
+    def ntfy_proxy(url: ParseResult) -> Optional[ParseResult]:
+        proxy = urllib.request.getproxies().get(url.scheme)
+        if not proxy:
+            return None
+        if urllib.request.proxy_bypass(f"{url.hostname}:{url.port}" if url.port else url.hostname):
+            return None
+        if "://" not in proxy:
+            proxy = f"http://{proxy}"
+        return urlparse(proxy)
+
+    def build_notification(
+        self, level: str, source: str, message: str, event_timestamp: str, hostname: str
+    ) -> Tuple[bytes, Dict[str, str]]:
+        now = int(time.time())
+        cached_second, timestamp = self.notify_timestamp
+        if now != cached_second:
+            timestamp = datetime.fromtimestamp(now, timezone.utc).isoformat(timespec="seconds")
+            self.notify_timestamp = (now, timestamp)
+
+        values = (source, level, message, event_timestamp, hostname, timestamp)
         if self.notifications.message_format == "json":
-            payload = json.dumps(notification_event).encode("utf-8")
-            content_type = "application/json"
+            fields = ", ".join(key + json.dumps(value) for key, value in zip(self.NOTIFY_JSON_KEYS, values))
+            payload = self.notify_payload_prefix + fields.encode("utf-8") + b"}"
         else:
-            payload = self.to_yaml(notification_event).encode("utf-8")
-            content_type = "application/x-yaml"
-
-        request = urllib.request.Request(
-            self.notifications.ntfy_url,
-            data=payload,
-            method="POST",
-            headers={
-                "Content-Type": content_type,
+            fields = "".join(key + value.replace("'", "''") + "'\n" for key, value in zip(self.NOTIFY_YAML_KEYS, values))
+            payload = self.notify_payload_prefix + fields.encode("utf-8")
+
+        headers = self.notify_headers.get((level, source))
+        if headers is None:
+            headers = {
+                **self.notify_base_headers,
                 "Title": f"{self.notifications.title_prefix} {level} [{source}]",
                 "Tags": level.lower(),
-                **({"Authorization": f"Bearer {self.notifications.auth_token}"} if self.notifications.auth_token else {}),
-            },
-        )
-
-        try:
-            with urllib.request.urlopen(request, timeout=10):  # nosec B310 - URL scheme validated in NotificationConfig.ntfy_url
-                return
-        except urllib.error.URLError as exc:
-            self.log("ERROR", "notification", f"Failed to deliver ntfy notification: {exc}")
+            }
+            self.notify_headers[(level, source)] = headers
+        return payload, headers
 
     @staticmethod
     def to_yaml(payload: Dict[str, str]) -> str:
@@ -357,25 +955,64 @@ class LogForwarder:
             lines.append(f"{key}: '{escaped}'")
         return "\n".join(lines) + "\n"
 
+    def load_offsets(self) -> None:
+        if not self.offsets_file:
+            return
+        try:
+            with open(self.offsets_file, "r", encoding="utf-8") as fh:
+                stored = json.load(fh)
+            offsets = {}
+            for key, offset in stored.items():
+                device, inode = key.split(":")
+                offsets[(int(device), int(inode))] = int(offset)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, AttributeError) as exc:
+            self.log("WARN", "general", f"Ignoring unreadable offsets file {self.offsets_file}: {exc}")
+            return
+        self.offsets.update(offsets)
+        self.saved_offsets = dict(self.offsets)
+
+    def save_offsets(self) -> None:
+        if not self.offsets_file or self.offsets == self.saved_offsets:
+            return
+        payload = {f"{device}:{inode}": offset for (device, inode), offset in self.offsets.items()}
+        try:
+            self.write_atomic(self.offsets_file, json.dumps(payload).encode("utf-8"))
+        except OSError as exc:
+            if not self.offsets_save_failed:
+                self.log("WARN", "general", f"Failed to save offsets to {self.offsets_file}: {exc}")
+            self.offsets_save_failed = True
+            return
+        self.offsets_save_failed = False
+        self.saved_offsets = dict(self.offsets)
+
     def write_health(self) -> None:
-        payload = {
-            "status": "ok",
-            "timestamp": int(time.time()),
-            "updatefreq": self.update_seconds,
-            "sources": [source.name for source in self.sources],
-        }
-        directory = os.path.dirname(HEALTH_FILE) or "."
-        os.makedirs(directory, mode=0o700, exist_ok=True)
-        temp_path = ""
-        fd, temp_path = tempfile.mkstemp(prefix=f".{APP_NAME}.", dir=directory)
+        prefix, suffix = self.health_template
+        self.write_atomic(HEALTH_FILE, prefix + str(int(time.time())).encode("ascii") + suffix)
+
+    @staticmethod
+    def write_atomic(path: str, data: bytes) -> None:
+        temp_path = f"{path}.tmp"
         try:
-            with os.fdopen(fd, "w", encoding="utf-8") as fh:
-                json.dump(payload, fh)
-            os.chmod(temp_path, 0o600)
-            os.replace(temp_path, HEALTH_FILE)
-        finally:
-            if temp_path and os.path.exists(temp_path):
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+        try:
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view) :]
+            finally:
+                os.close(fd)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
                 os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
 
 
 def main() -> int: